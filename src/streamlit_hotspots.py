@@ -2,15 +2,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import folium
-from streamlit_folium import st_folium
-from folium import plugins
-import seaborn as sns
-import matplotlib.pyplot as plt
-from geopy.distance import geodesic
+import os
+import json
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -42,34 +35,335 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
+RIDE_SUMMARY_CSV = 'data/ride_summary.csv'
+RIDE_SUMMARY_PARQUET = 'data/ride_summary.parquet'
+# Written by uber_analysis.py; when present it is read instead of the CSV and
+# is never rewritten by the dashboard
+RIDE_SUMMARY_EXPORT = 'data/ride_summary_export.parquet'
+RIDE_COLUMNS = ['lat', 'long', 'ride_count', 'week_index', 'type', 'customer_id']
+# Compact dtypes make the per-rerun filters and groupbys cheaper
+RIDE_DTYPES = {'lat': 'float32', 'long': 'float32', 'type': 'category',
+               'week_index': 'int16', 'ride_count': 'int32', 'customer_id': 'int64'}
+# Integer codes for the ride type, filtered on instead of the type labels
+TYPE_CODES = {'origin': 0, 'destination': 1}
+# float32 coordinates are widened and rounded to this many decimals before
+# being sent to the map, so the JSON does not carry float32 rounding noise
+COORD_DECIMALS = 5
+
+# Coordinates are quantized to 1/LOCATION_KEY_SCALE degrees (~11 m) when a
+# (lat, long) pair is packed into a single int64 location key
+LOCATION_KEY_SCALE = 10_000
+
+# Busiest locations sent on the first map render, before the viewport is known
+MAX_INITIAL_MAP_POINTS = 1000
+
+# Static map settings, built once at import rather than on every map build
+NYC_CENTER = [40.7128, -74.0060]
+MAP_TILES = 'OpenStreetMap'
+# Heatmap points are summed per grid cell of this many decimal degrees (3 ~ 100m)
+HEATMAP_BIN_DECIMALS = 3
+HEATMAP_GRADIENT = {0.4: 'blue', 0.6: 'cyan', 0.7: 'lime', 0.8: 'yellow', 1.0: 'red'}
+
+# Popup headers by type code; format_popups appends the per-marker fields
+ORIGIN_POPUP_HEADER = """
+                <div style='font-family: Arial; width: 200px;'>
+                    <h3 style='color: #1f77b4; margin: 0;'> PICKUP LOCATION</h3>
+                    <hr style='margin: 5px 0;'>
+                    """
+DESTINATION_POPUP_HEADER = """
+                <div style='font-family: Arial; width: 200px;'>
+                    <h3 style='color: #d62728; margin: 0;'>🏁 DROP-OFF LOCATION</h3>
+                    <hr style='margin: 5px 0;'>
+                    """
+
+# Sizes each GeoJSON circle marker and binds its popup as a DOM node, which
+# st_folium needs to report last_object_clicked_popup
+CIRCLE_MARKER_ON_EACH_FEATURE = """
+function (feature, layer) {
+    layer.setRadius(feature.properties.radius);
+    var popup = document.createElement('div');
+    popup.innerHTML = feature.properties.popup;
+    layer.bindPopup(popup);
+}
+"""
+
+# Above this many points the map clusters on the server instead of in the browser
+PRECLUSTER_MIN_POINTS = 5000
+# Approximate on-screen width of a server-side cluster cell
+CLUSTER_CELL_PIXELS = 60
+
+CLUSTER_POPUP = """
+                <div style='font-family: Arial;'>
+                    <h4 style='color: #9467bd; margin: 0;'>Ride Cluster</h4>
+                    <b>Points:</b> {points}<br>
+                    <b>Rides:</b> {rides}
+                </div>
+                """
+
+# Marker styles indexed by type code (see TYPE_CODES), looked up rather than
+# branched on, both here and in the browser
+MARKER_STYLES = [
+    {'color': '#1f77b4', 'markerColor': 'blue', 'icon': 'car', 'label': 'Pickup'},
+    {'color': '#d62728', 'markerColor': 'red', 'icon': 'flag', 'label': 'Drop-off'}
+]
+
+# Builds each clustered marker client-side from a [lat, long, type_code, rides,
+# trips] row; trips is the number of trip rows the marker stands for
+CLUSTER_MARKER_CALLBACK = """
+(function (styles) {
+    return function (row) {
+        var style = styles[row[2]];
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {trips: row[4]});
+        marker.setIcon(L.AwesomeMarkers.icon({markerColor: style.markerColor, icon: style.icon, prefix: 'fa'}));
+        marker.bindPopup(
+            "<div style='font-family: Arial;'>" +
+            "<h4 style='color: " + style.color + "; margin: 0;'>" + style.label + " Location</h4>" +
+            "<b>Rides:</b> " + row[3] +
+            "</div>"
+        );
+        return marker;
+    };
+})(%s)
+""" % json.dumps(MARKER_STYLES)
+
+# Markers are one per location and week, so cluster bubbles sum their trips
+# (as the default per-trip markers were counted) instead of counting markers
+CLUSTER_ICON_CREATE_FUNCTION = """
+function (cluster) {
+    var trips = 0;
+    cluster.getAllChildMarkers().forEach(function (marker) {
+        trips += marker.options.trips;
+    });
+    var size = trips < 10 ? 'small' : trips < 100 ? 'medium' : 'large';
+    return new L.DivIcon({
+        html: '<div><span>' + trips + '</span></div>',
+        className: 'marker-cluster marker-cluster-' + size,
+        iconSize: new L.Point(40, 40)
+    });
+}
+"""
+
+def convert_ride_summary():
+    """Convert the ride summary CSV to a typed Parquet file (one-time step).
+
+    The Parquet copy is only a cache of the CSV and is rebuilt whenever the
+    CSV is newer than it. Returns False if it could not be written, in which
+    case callers read the CSV.
+    """
+    if (os.path.exists(RIDE_SUMMARY_PARQUET) and
+            os.path.getmtime(RIDE_SUMMARY_PARQUET) >= os.path.getmtime(RIDE_SUMMARY_CSV)):
+        return True
+    
+    ride_summary = pd.read_csv(RIDE_SUMMARY_CSV, dtype=RIDE_DTYPES)
+    try:
+        ride_summary.to_parquet(RIDE_SUMMARY_PARQUET, engine='pyarrow', compression='zstd', index=False)
+    except OSError:
+        return False
+    return True
+
+def aggregate_ride_summary(ride_summary):
+    """Collapse the per-trip rows to one row per (lat, long, type, week).
+
+    ride_count is summed so every ride total is unchanged, trip_count keeps
+    the number of trip rows merged and location_rides the per-location ride
+    count each of those rows carried. Rows are sorted by week so week
+    filters scan contiguous memory.
+    """
+    return ride_summary.groupby(['lat', 'long', 'type', 'week_index'], observed=True, sort=False).agg(
+        ride_count=('ride_count', 'sum'),
+        trip_count=('ride_count', 'size'),
+        location_rides=('ride_count', 'first'),
+        customer_id=('customer_id', 'first')
+    ).reset_index().sort_values('week_index', kind='stable', ignore_index=True)
+
+@st.cache_resource
 def load_data():
-    """Load and cache the data for better performance."""
+    """Load and cache the data for better performance.
+
+    Cached as a resource so reruns share one copy instead of unpickling the
+    frames each time; callers must treat the returned frames as read-only.
+    """
     try:
         user_summary = pd.read_csv('data/user_summary.csv')
-        ride_summary = pd.read_csv('data/ride_summary.csv')
-        return user_summary, ride_summary
+        
+        # A fresh analysis export takes precedence over the committed CSV
+        if os.path.exists(RIDE_SUMMARY_EXPORT):
+            ride_parquet = RIDE_SUMMARY_EXPORT
+        elif convert_ride_summary():
+            ride_parquet = RIDE_SUMMARY_PARQUET
+        else:
+            ride_parquet = None
+        
+        if ride_parquet:
+            # Column-projected read. The CSV cache is written with RIDE_DTYPES, so
+            # the astype is a no-op for it unless the cache predates a change to
+            # them; the analysis export keeps its own dtypes and is always cast
+            ride_summary = pd.read_parquet(
+                ride_parquet, engine='pyarrow', columns=RIDE_COLUMNS
+            ).astype(RIDE_DTYPES)
+        else:
+            ride_summary = pd.read_csv(RIDE_SUMMARY_CSV, usecols=RIDE_COLUMNS, dtype=RIDE_DTYPES)
+        ride_data = aggregate_ride_summary(ride_summary)
+        
+        # Ride counts are small non-negative integers, keep them in the narrowest unsigned type
+        for column in ('ride_count', 'location_rides'):
+            ride_data[column] = pd.to_numeric(ride_data[column], downcast='unsigned')
+        ride_data['type_code'] = ride_data['type'].map(TYPE_CODES).astype('int8')
+        return user_summary, ride_data
     except FileNotFoundError as e:
         st.error(f"Data file not found: {e}")
         st.stop()
 
-def create_hotspot_map(ride_data, selected_weeks=None, selected_type=None, cluster_size=50):
+@st.cache_resource(max_entries=16)
+def get_filtered(weeks, selected_type):
+    """Filter the ride data once per selection so every view can share the result.
 
+    Like load_data, the frame is shared by reference and must not be mutated.
+    """
+    _, ride_data = load_data()
+    
+    # Combine the conditions into one mask and index once, so only the final
+    # frame is allocated
+    mask = np.ones(len(ride_data), dtype=bool)
+    if weeks:
+        # week_index is a small non-negative integer, so a boolean lookup
+        # table indexed by week replaces isin's per-row hash probes
+        week_index = ride_data['week_index'].to_numpy()
+        selected = np.zeros(max(int(week_index.max(initial=0)), max(weeks)) + 1, dtype=bool)
+        selected[list(weeks)] = True
+        mask &= selected[week_index]
     
-    # Filter data based on selections
-    filtered_data = ride_data.copy()
+    if selected_type and selected_type != 'All':
+        mask &= ride_data['type_code'].to_numpy() == TYPE_CODES[selected_type.lower()]
     
-    if selected_weeks:
-        filtered_data = filtered_data[filtered_data['week_index'].isin(selected_weeks)]
+    return ride_data[mask]
+
+def get_map_view(map_data, folium_map):
+    """Turn the bounds/zoom returned by st_folium into a reusable map view.
+
+    Bounds are rounded outward to a 0.01 degree grid so small pans reuse the
+    cached map. Returns None until the browser has reported its viewport:
+    before that st_folium returns folium_map's own data bounds and zoom,
+    which are not a view the user chose.
+    """
+    bounds = (map_data or {}).get('bounds') or {}
+    south_west = bounds.get('_southWest') or {}
+    north_east = bounds.get('_northEast') or {}
+    south, west = south_west.get('lat'), south_west.get('lng')
+    north, east = north_east.get('lat'), north_east.get('lng')
+    if None in (south, west, north, east):
+        return None
+    if [[south, west], [north, east]] == folium_map.get_bounds():
+        return None
     
-    if selected_type and selected_type != 'All':
-        filtered_data = filtered_data[filtered_data['type'] == selected_type.lower()]
+    return {
+        'key': (np.floor(south * 100) / 100, np.floor(west * 100) / 100,
+                np.ceil(north * 100) / 100, np.ceil(east * 100) / 100),
+        'center': ((south + north) / 2, (west + east) / 2),
+        'zoom': map_data.get('zoom')
+    }
+
+@st.cache_resource(max_entries=16)
+def get_hotspot_map(weeks_key, selected_type, cluster_size, view_key=None, zoom=None):
+    """Build the hotspot map once per filter selection and view, and reuse it across reruns.
+
+    The map is held by reference rather than pickled, so unrelated widget
+    interactions no longer rebuild thousands of markers. Before the map has
+    reported its viewport only the busiest locations are sent; afterwards
+    only the points inside the (rounded) visible bounds are. The full HTML
+    render is also done here, once, so st_folium can skip it on reruns.
+    """
+    filtered_data = get_filtered(weeks_key, selected_type)
+    
+    if view_key is None:
+        filtered_data = filtered_data.nlargest(MAX_INITIAL_MAP_POINTS, 'ride_count')
+    else:
+        south, west, north, east = view_key
+        filtered_data = filtered_data[
+            filtered_data['lat'].between(south, north) &
+            filtered_data['long'].between(west, east)
+        ]
+    
+    hotspot_map = create_hotspot_map(filtered_data, cluster_size, zoom)
+    hotspot_map.get_root().render()
+    return hotspot_map
+
+def pack_location_keys(lats, longs):
+    """Pack quantized (lat, long) pairs into int64 keys: lat in the high 32 bits, long in the low 32."""
+    lat_q = np.round(np.asarray(lats, dtype=np.float64) * LOCATION_KEY_SCALE).astype(np.int64)
+    long_q = np.round(np.asarray(longs, dtype=np.float64) * LOCATION_KEY_SCALE).astype(np.int64)
+    return (lat_q << 32) | (long_q & 0xFFFFFFFF)
+
+def unpack_location_keys(keys):
+    """Inverse of pack_location_keys, returning (lats, longs) in degrees."""
+    keys = np.asarray(keys, dtype=np.int64)
+    lats = (keys >> 32) / LOCATION_KEY_SCALE
+    longs = (keys & 0xFFFFFFFF).astype(np.uint32).view(np.int32) / LOCATION_KEY_SCALE
+    return lats, longs
+
+def count_unique_locations(location_keys):
+    """Count distinct packed location keys with a hash table, without building a deduplicated frame."""
+    return pd.unique(location_keys).size
+
+def precluster_points(lats, longs, rides, cell_deg):
+    """Group points into square grid cells of cell_deg degrees.
+
+    Returns per-cluster (lat, long, rides, points) arrays, with each cluster
+    placed at the centroid of its points.
+    """
+    cells = np.stack([np.floor(lats / cell_deg), np.floor(longs / cell_deg)], axis=1)
+    _, cluster_idx = np.unique(cells, axis=0, return_inverse=True)
+    cluster_idx = cluster_idx.ravel()
+    
+    cluster_points = np.bincount(cluster_idx)
+    cluster_lats = np.bincount(cluster_idx, weights=lats) / cluster_points
+    cluster_longs = np.bincount(cluster_idx, weights=longs) / cluster_points
+    cluster_rides = np.bincount(cluster_idx, weights=rides).astype(np.int64)
+    return cluster_lats, cluster_longs, cluster_rides, cluster_points
+
+def format_popups(type_codes, cust, wk, counts, lats, longs):
+    """Build the popup HTML for every marker as an object array.
+
+    One f-string per marker over plain Python lists; np.char loops per
+    element in Python as well, and with a far higher per-call cost.
+    """
+    headers = (ORIGIN_POPUP_HEADER, DESTINATION_POPUP_HEADER)
+    return np.array([
+        f"{headers[code]}<b>Customer ID:</b> {c}<br><b>Week:</b> {w}"
+        f"<br><b>Total Rides:</b> {n}<br><b>Coordinates:</b> {lat:.4f}, {lon:.4f}</div>"
+        for code, c, w, n, lat, lon in zip(type_codes.tolist(), cust.tolist(), wk.tolist(),
+                                           counts.tolist(), lats.tolist(), longs.tolist())
+    ], dtype=object)
+
+def circle_markers_geojson(lats, longs, radii, popups):
+    """Build a GeoJSON FeatureCollection of points carrying a radius and popup each."""
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': {'radius': r, 'popup': popup}
+            }
+            for lat, lon, r, popup in zip(lats.tolist(), longs.tolist(), radii.tolist(), popups.tolist())
+        ]
+    }
+
+def create_hotspot_map(filtered_data, cluster_size=50, zoom=None):
+    """Create the hotspot map from already-filtered ride data.
+
+    zoom (defaulting to the initial zoom) sets the grid size used when the
+    point count is large enough to pre-cluster on the server.
+    """
+    # Imported lazily so views without the map skip the folium import cost
+    import folium
+    from folium import plugins
     
     # Create base map centered on NYC
     m = folium.Map(
-        location=[40.7128, -74.0060],
+        location=NYC_CENTER,
         zoom_start=11,
-        tiles='OpenStreetMap'
+        tiles=MAP_TILES
     )
     
     # Create separate layer groups for better organization
@@ -77,56 +371,35 @@ def create_hotspot_map(ride_data, selected_weeks=None, selected_type=None, clust
     destinations_group = folium.FeatureGroup(name='🔴 Drop-off Locations (Destinations)', show=True)
     heatmap_group = folium.FeatureGroup(name='🔥 Ride Density Heatmap', show=True)
     
-    # Add origins (blue markers) - PICKUP LOCATIONS
-    origins = filtered_data[filtered_data['type'] == 'origin']
-    if not origins.empty:
-        for idx, row in origins.iterrows():
-            folium.CircleMarker(
-                location=[row['lat'], row['long']],
-                radius=max(3, min(15, row['ride_count'] / 5)),  # Size based on ride count
-                popup=f"""
-                <div style='font-family: Arial; width: 200px;'>
-                    <h3 style='color: #1f77b4; margin: 0;'> PICKUP LOCATION</h3>
-                    <hr style='margin: 5px 0;'>
-                    <b>Customer ID:</b> {row['customer_id']}<br>
-                    <b>Week:</b> {row['week_index']}<br>
-                    <b>Total Rides:</b> {row['ride_count']}<br>
-                    <b>Coordinates:</b> {row['lat']:.4f}, {row['long']:.4f}
-                </div>
-                """,
-                color='#1f77b4',  # Blue color
-                fill=True,
-                fillOpacity=0.7,
-                weight=2
-            ).add_to(origins_group)
-    
-    # Add destinations (red markers) - DROP-OFF LOCATIONS
-    destinations = filtered_data[filtered_data['type'] == 'destination']
-    if not destinations.empty:
-        for idx, row in destinations.iterrows():
-            folium.CircleMarker(
-                location=[row['lat'], row['long']],
-                radius=max(3, min(15, row['ride_count'] / 5)),
-                popup=f"""
-                <div style='font-family: Arial; width: 200px;'>
-                    <h3 style='color: #d62728; margin: 0;'>🏁 DROP-OFF LOCATION</h3>
-                    <hr style='margin: 5px 0;'>
-                    <b>Customer ID:</b> {row['customer_id']}<br>
-                    <b>Week:</b> {row['week_index']}<br>
-                    <b>Total Rides:</b> {row['ride_count']}<br>
-                    <b>Coordinates:</b> {row['lat']:.4f}, {row['long']:.4f}
-                </div>
-                """,
-                color='#d62728',  # Red color
-                fill=True,
-                fillOpacity=0.7,
-                weight=2
-            ).add_to(destinations_group)
+    # Add pickup (blue) and drop-off (red) markers as one GeoJSON layer per
+    # type instead of a folium object per marker
+    lats = filtered_data['lat'].to_numpy(np.float64).round(COORD_DECIMALS)
+    longs = filtered_data['long'].to_numpy(np.float64).round(COORD_DECIMALS)
+    counts = filtered_data['location_rides'].to_numpy()
+    cust = filtered_data['customer_id'].to_numpy()
+    wk = filtered_data['week_index'].to_numpy()
+    type_codes = filtered_data['type_code'].to_numpy()
+    radii = np.clip(counts / 5, 3, 15).round(2)  # Size based on ride count
+    popups = format_popups(type_codes, cust, wk, counts, lats, longs)
+    for code, group in ((TYPE_CODES['origin'], origins_group),
+                        (TYPE_CODES['destination'], destinations_group)):
+        rows = type_codes == code
+        folium.GeoJson(
+            circle_markers_geojson(lats[rows], longs[rows], radii[rows], popups[rows]),
+            marker=folium.CircleMarker(color=MARKER_STYLES[code]['color'], fill=True,
+                                       fillOpacity=0.7, weight=2),
+            on_each_feature=folium.JsCode(CIRCLE_MARKER_ON_EACH_FEATURE),
+            control=False
+        ).add_to(group)
     
     # Add heatmap layer
     if not filtered_data.empty:
-        heat_data = [[row['lat'], row['long'], row['ride_count']] 
-                    for idx, row in filtered_data.iterrows()]
+        # Sum rides per grid cell; overlapping points render identically anyway
+        binned = filtered_data.assign(
+            lat_b=lats.round(HEATMAP_BIN_DECIMALS),
+            long_b=longs.round(HEATMAP_BIN_DECIMALS)
+        ).groupby(['lat_b', 'long_b'], sort=False)['ride_count'].sum().reset_index()
+        heat_data = binned[['lat_b', 'long_b', 'ride_count']].to_numpy().tolist()
         plugins.HeatMap(
             heat_data, 
             name="Ride Density",
@@ -134,34 +407,40 @@ def create_hotspot_map(ride_data, selected_weeks=None, selected_type=None, clust
             max_zoom=18,
             radius=20,
             blur=15,
-            gradient={0.4: 'blue', 0.6: 'cyan', 0.7: 'lime', 0.8: 'yellow', 1.0: 'red'}
+            gradient=HEATMAP_GRADIENT
         ).add_to(heatmap_group)
     
     # Add clustering for better performance
-    if len(filtered_data) > cluster_size:
-        marker_cluster = plugins.MarkerCluster().add_to(m)
-        
-        # Add markers to cluster
-        for idx, row in filtered_data.iterrows():
-            if row['type'] == 'origin':
-                color = '#1f77b4'
-                icon = 'car'
-                label = 'Pickup'
-            else:
-                color = '#d62728'
-                icon = 'flag'
-                label = 'Drop-off'
-                
-            folium.Marker(
-                [row['lat'], row['long']],
-                popup=f"""
-                <div style='font-family: Arial;'>
-                    <h4 style='color: {color}; margin: 0;'>{label} Location</h4>
-                    <b>Rides:</b> {row['ride_count']}
-                </div>
-                """,
-                icon=folium.Icon(color=color, icon=icon, prefix='fa')
-            ).add_to(marker_cluster)
+    if len(filtered_data) > PRECLUSTER_MIN_POINTS:
+        # Too many points even for browser-side clustering: bucket them on a
+        # zoom-dependent grid here and draw one circle per cluster
+        cell_deg = CLUSTER_CELL_PIXELS * 360 / (256 * 2 ** (zoom or 11))
+        cluster_lats, cluster_longs, cluster_rides, cluster_points = precluster_points(
+            lats, longs, filtered_data['ride_count'].to_numpy(), cell_deg
+        )
+        clusters_group = folium.FeatureGroup(name='🗂️ Ride Clusters', show=True)
+        cluster_radii = 5 + 20 * cluster_rides / cluster_rides.max()
+        for lat, lon, r, rides, points in zip(cluster_lats, cluster_longs, cluster_radii,
+                                              cluster_rides, cluster_points):
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=r,
+                popup=CLUSTER_POPUP.format(points=points, rides=rides),
+                color='#9467bd',
+                fill=True,
+                fillOpacity=0.5,
+                weight=1
+            ).add_to(clusters_group)
+        clusters_group.add_to(m)
+    elif len(filtered_data) > cluster_size:
+        # Ship raw [lat, long, type_code, rides, trips] rows; markers are built in the browser
+        cluster_data = list(zip(lats.tolist(), longs.tolist(), type_codes.tolist(), counts.tolist(),
+                                filtered_data['trip_count'].tolist()))
+        plugins.FastMarkerCluster(
+            cluster_data,
+            callback=CLUSTER_MARKER_CALLBACK,
+            icon_create_function=CLUSTER_ICON_CREATE_FUNCTION
+        ).add_to(m)
     
     # Add all groups to map
     origins_group.add_to(m)
@@ -173,15 +452,108 @@ def create_hotspot_map(ride_data, selected_weeks=None, selected_type=None, clust
     
     return m
 
-def create_ride_distribution_chart(ride_data, selected_weeks=None, selected_type=None):
-    """Create interactive charts for ride distribution analysis."""
-    
-    # Filter data
-    filtered_data = ride_data.copy()
-    if selected_weeks:
-        filtered_data = filtered_data[filtered_data['week_index'].isin(selected_weeks)]
-    if selected_type and selected_type != 'All':
-        filtered_data = filtered_data[filtered_data['type'] == selected_type.lower()]
+def weekly_sum_and_trend(week_idx, counts):
+    """Sum rides per week and fit a straight trend line in closed form.
+
+    Returns (weeks, weekly_totals, slope, intercept). A single bincount pass
+    replaces the groupby, and the degree-1 least-squares fit needs only a
+    handful of sums instead of np.polyfit.
+    """
+    if len(week_idx) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), 0.0, 0.0
+    
+    sums = np.bincount(week_idx, weights=counts)
+    seen = np.bincount(week_idx) > 0
+    weeks = np.flatnonzero(seen)
+    weekly_totals = sums[seen].astype(np.int64)
+    
+    x = weeks.astype(np.float64)
+    y = weekly_totals.astype(np.float64)
+    n = len(x)
+    sum_x, sum_y = x.sum(), y.sum()
+    denom = n * (x @ x) - sum_x ** 2
+    slope = (n * (x @ y) - sum_x * sum_y) / denom if denom else 0.0
+    intercept = (sum_y - slope * sum_x) / n
+    return weeks, weekly_totals, slope, intercept
+
+@st.cache_data(max_entries=16)
+def get_weekly_totals(weeks_key=(), selected_type='All'):
+    """Weekly ride totals and trend for a filter selection (the full table by default).
+
+    Shared by the distribution chart and the forecast so the weekly
+    aggregation runs once per selection instead of at every call site.
+    """
+    filtered_data = get_filtered(weeks_key, selected_type)
+    return weekly_sum_and_trend(
+        filtered_data['week_index'].to_numpy(),
+        filtered_data['ride_count'].to_numpy()
+    )
+
+@st.cache_data(max_entries=16)
+def get_ride_metrics(weeks_key, selected_type):
+    """Total rides, unique locations and trip rows for the sidebar, once per filter selection."""
+    filtered_data = get_filtered(weeks_key, selected_type)
+    location_keys = pack_location_keys(filtered_data['lat'].to_numpy(), filtered_data['long'].to_numpy())
+    return (int(filtered_data['ride_count'].sum()),
+            count_unique_locations(location_keys),
+            int(filtered_data['trip_count'].sum()))
+
+@st.cache_data(max_entries=16)
+def get_type_metrics(weeks_key, selected_type):
+    """Pickup/drop-off trip counts and unique locations for the map summary.
+
+    Returns (origins, destinations, unique origins, unique destinations);
+    only computed when the map view is shown.
+    """
+    filtered_data = get_filtered(weeks_key, selected_type)
+    location_keys = pack_location_keys(filtered_data['lat'].to_numpy(), filtered_data['long'].to_numpy())
+    type_codes = filtered_data['type_code'].to_numpy()
+    type_trips = np.bincount(type_codes, weights=filtered_data['trip_count'].to_numpy(),
+                             minlength=len(TYPE_CODES)).astype(np.int64)
+    is_origin = type_codes == TYPE_CODES['origin']
+    return (int(type_trips[TYPE_CODES['origin']]),
+            int(type_trips[TYPE_CODES['destination']]),
+            count_unique_locations(location_keys[is_origin]),
+            count_unique_locations(location_keys[~is_origin]))
+
+@st.cache_data(max_entries=16)
+def get_top_locations(weeks_key, selected_type, n=10):
+    """Labels and ride totals for the busiest locations, recomputed only when the filters change."""
+    filtered_data = get_filtered(weeks_key, selected_type)
+    
+    # Group on one packed int64 key instead of a (float, float) MultiIndex
+    keys = pack_location_keys(filtered_data['lat'].to_numpy(), filtered_data['long'].to_numpy())
+    top = filtered_data['ride_count'].groupby(keys, sort=False).sum().nlargest(n)
+    
+    top_lats, top_longs = unpack_location_keys(top.index.to_numpy())
+    lats = np.char.mod('%.3f', top_lats).astype(str)
+    longs = np.char.mod('%.3f', top_longs).astype(str)
+    labels = np.char.add(np.char.add(np.char.add('📍 (', lats), np.char.add(', ', longs)), ')')
+    return labels.tolist(), top.to_numpy().tolist()
+
+def histogram_bars(values, weights=None, bins=20):
+    """Bin values with np.histogram and return go.Bar keyword arguments.
+
+    Only the per-bin totals are sent to the browser instead of every raw
+    value; customdata carries each bar's [low, high) edges for the hover text.
+    """
+    counts, edges = np.histogram(values, bins=bins, weights=weights)
+    return dict(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts.astype(np.int64),
+        width=edges[1] - edges[0],
+        customdata=np.column_stack([edges[:-1], edges[1:]])
+    )
+
+def create_ride_distribution_chart(filtered_data, top_locations, weekly_totals):
+    """Create interactive charts for ride distribution analysis.
+
+    top_locations is the (labels, ride totals) pair from get_top_locations and
+    weekly_totals the (weeks, totals, slope, intercept) tuple from get_weekly_totals.
+    """
+    # Imported lazily so views that don't plot skip the plotly import cost
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
     
     # Create subplots
     fig = make_subplots(
@@ -192,11 +564,11 @@ def create_ride_distribution_chart(ride_data, selected_weeks=None, selected_type
     )
     
     # 1. Animated Weekly Trends with smooth lines
-    weekly_rides = filtered_data.groupby('week_index')['ride_count'].sum().reset_index()
+    weeks, weekly_rides, slope, intercept = weekly_totals
     fig.add_trace(
         go.Scatter(
-            x=weekly_rides['week_index'], 
-            y=weekly_rides['ride_count'],
+            x=weeks, 
+            y=weekly_rides,
             mode='lines+markers',
             name='Weekly Rides',
             line=dict(color='#1f77b4', width=3, shape='spline'),
@@ -207,12 +579,10 @@ def create_ride_distribution_chart(ride_data, selected_weeks=None, selected_type
     )
     
     # Add trend line
-    z = np.polyfit(weekly_rides['week_index'], weekly_rides['ride_count'], 1)
-    p = np.poly1d(z)
     fig.add_trace(
         go.Scatter(
-            x=weekly_rides['week_index'],
-            y=p(weekly_rides['week_index']),
+            x=weeks,
+            y=slope * weeks + intercept,
             mode='lines',
             name='Trend',
             line=dict(color='red', width=2, dash='dash'),
@@ -222,7 +592,8 @@ def create_ride_distribution_chart(ride_data, selected_weeks=None, selected_type
     )
     
     # 2. Enhanced Pie Chart with animations
-    type_counts = filtered_data['type'].value_counts()
+    type_counts = filtered_data.groupby('type', observed=True)['trip_count'].sum()
+    type_counts = type_counts.reindex(['origin', 'destination']).dropna().astype(int)
     fig.add_trace(
         go.Pie(
             labels=['🚗 Pickups', '🏁 Drop-offs'] if len(type_counts) == 2 else type_counts.index,
@@ -237,12 +608,11 @@ def create_ride_distribution_chart(ride_data, selected_weeks=None, selected_type
     )
     
     # 3. Top Locations with enhanced styling
-    top_locations = filtered_data.groupby(['lat', 'long'])['ride_count'].sum().nlargest(10)
-    location_labels = [f"📍 ({lat:.3f}, {lon:.3f})" for lat, lon in top_locations.index]
+    top_labels, top_rides = top_locations
     fig.add_trace(
         go.Bar(
-            x=location_labels, 
-            y=top_locations.values,
+            x=top_labels, 
+            y=top_rides,
             name='Top Locations',
             marker_color='#2ca02c',
             hovertemplate='<b>%{x}</b><br>Ride Count: %{y}<extra></extra>'
@@ -252,13 +622,14 @@ def create_ride_distribution_chart(ride_data, selected_weeks=None, selected_type
     
     # 4. Enhanced Histogram
     fig.add_trace(
-        go.Histogram(
-            x=filtered_data['ride_count'], 
-            nbinsx=20,
+        go.Bar(
+            # One entry per trip row, weighted back from the aggregated rows
+            **histogram_bars(filtered_data['location_rides'].to_numpy(),
+                             weights=filtered_data['trip_count'].to_numpy()),
             name='Ride Count Distribution',
             marker_color='#ff7f0e',
             opacity=0.7,
-            hovertemplate='<b>Ride Count Range</b><br>Count: %{y}<br>Range: %{x}<extra></extra>'
+            hovertemplate='<b>Ride Count Range</b><br>Count: %{y}<br>Range: %{customdata[0]:.0f}-%{customdata[1]:.0f}<extra></extra>'
         ),
         row=2, col=2
     )
@@ -286,17 +657,36 @@ def create_ride_distribution_chart(ride_data, selected_weeks=None, selected_type
     
     return fig
 
-def create_user_analysis_chart(user_data, selected_weeks=None):
+@st.cache_resource(max_entries=16)
+def get_distribution_chart(weeks_key, selected_type):
+    """Build the distribution figure once per filter selection.
+
+    Held by reference like the hotspot map: unpickling a Figure re-validates
+    every trace and costs several times more than st.plotly_chart's own
+    serialization, so cache hits skip it. The figure must not be mutated.
+    """
+    return create_ride_distribution_chart(
+        get_filtered(weeks_key, selected_type),
+        get_top_locations(weeks_key, selected_type),
+        get_weekly_totals(weeks_key, selected_type)
+    )
+
+@st.cache_data(max_entries=16)
+def get_active_users(lo=None, hi=None):
+    """Users whose activity overlaps the week range [lo, hi] (all users if unset)."""
+    user_data, _ = load_data()
+    if lo is None or hi is None:
+        return user_data
+    
+    # Compare the raw arrays directly, skipping Series alignment
+    mask = (user_data['first_week'].to_numpy() <= hi) & (user_data['last_week'].to_numpy() >= lo)
+    return user_data.iloc[mask]
+
+def create_user_analysis_chart(active_users):
     """Create user analysis charts."""
-    
-    # Filter users based on their activity weeks
-    if selected_weeks:
-        active_users = user_data[
-            (user_data['first_week'] <= max(selected_weeks)) & 
-            (user_data['last_week'] >= min(selected_weeks))
-        ]
-    else:
-        active_users = user_data
+    # Imported lazily so views that don't plot skip the plotly import cost
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
     
     # Create subplots
     fig = make_subplots(
@@ -309,33 +699,31 @@ def create_user_analysis_chart(user_data, selected_weeks=None):
     
     # 1. Enhanced Rides per User Distribution
     fig.add_trace(
-        go.Histogram(
-            x=active_users['total_rides'], 
-            nbinsx=20, 
+        go.Bar(
+            **histogram_bars(active_users['total_rides'].to_numpy()),
             name='Total Rides',
             marker_color='#1f77b4',
             opacity=0.7,
-            hovertemplate='<b>Total Rides: %{x}</b><br>Users: %{y}<extra></extra>'
+            hovertemplate='<b>Total Rides: %{customdata[0]:.0f}-%{customdata[1]:.0f}</b><br>Users: %{y}<extra></extra>'
         ),
         row=1, col=1
     )
     
     # 2. Enhanced Weekly Rides Distribution
     fig.add_trace(
-        go.Histogram(
-            x=active_users['weekly_rides'], 
-            nbinsx=20, 
+        go.Bar(
+            **histogram_bars(active_users['weekly_rides'].to_numpy()),
             name='Weekly Rides',
             marker_color='#2ca02c',
             opacity=0.7,
-            hovertemplate='<b>Weekly Rides: %{x}</b><br>Users: %{y}<extra></extra>'
+            hovertemplate='<b>Weekly Rides: %{customdata[0]:.1f}-%{customdata[1]:.1f}</b><br>Users: %{y}<extra></extra>'
         ),
         row=1, col=2
     )
     
-    # 3. Enhanced Distance vs Weekly Rides Scatter
+    # 3. Enhanced Distance vs Weekly Rides Scatter (WebGL, one marker per user)
     fig.add_trace(
-        go.Scatter(
+        go.Scattergl(
             x=active_users['weekly_rides'], 
             y=active_users['avg_distance_miles'],
             mode='markers', 
@@ -391,8 +779,20 @@ def create_user_analysis_chart(user_data, selected_weeks=None):
     
     return fig
 
-def create_predictive_insights(user_data, ride_data):
-    """Predictive analytics and insights."""
+@st.cache_resource(max_entries=16)
+def get_user_analysis_chart(lo=None, hi=None):
+    """Build the user analysis figure once per week range, shared by reference like get_distribution_chart."""
+    return create_user_analysis_chart(get_active_users(lo, hi))
+
+def create_predictive_insights(user_data, weekly_totals):
+    """Predictive analytics and insights.
+
+    weekly_totals is the unfiltered (weeks, totals, slope, intercept) tuple
+    from get_weekly_totals.
+    """
+    import plotly.graph_objects as go
+    
+    historical_weeks, historical_rides, _, _ = weekly_totals
     
     # Calculate predictive metrics
     total_users = len(user_data)
@@ -440,25 +840,20 @@ def create_predictive_insights(user_data, ride_data):
     st.subheader("🔮 Predictive Analytics")
     
     # Simulate future weeks
-    future_weeks = list(range(100, 120))  # Next 20 weeks
-    predicted_rides = []
+    future_weeks = np.arange(100, 120)  # Next 20 weeks
     
-    for week in future_weeks:
-        # Simple linear growth model
-        base_rides = ride_data.groupby('week_index')['ride_count'].sum().mean()
-        growth_factor = 1 + (week - 100) * 0.01  # 1% growth per week
-        predicted_rides.append(base_rides * growth_factor)
+    # Simple linear growth model
+    base_rides = historical_rides.mean()
+    growth_factor = 1 + (future_weeks - 100) * 0.01  # 1% growth per week
+    predicted_rides = base_rides * growth_factor
     
     # Create prediction chart
     fig = go.Figure()
     
     # Historical data
-    historical_weeks = sorted(ride_data['week_index'].unique())
-    historical_rides = ride_data.groupby('week_index')['ride_count'].sum()
-    
     fig.add_trace(go.Scatter(
         x=historical_weeks,
-        y=historical_rides.values,
+        y=historical_rides,
         mode='lines+markers',
         name='Historical Data',
         line=dict(color='#1f77b4', width=3),
@@ -476,12 +871,12 @@ def create_predictive_insights(user_data, ride_data):
     ))
     
     # Confidence interval (simplified)
-    upper_bound = [r * 1.1 for r in predicted_rides]
-    lower_bound = [r * 0.9 for r in predicted_rides]
+    upper_bound = predicted_rides * 1.1
+    lower_bound = predicted_rides * 0.9
     
     fig.add_trace(go.Scatter(
-        x=future_weeks + future_weeks[::-1],
-        y=upper_bound + lower_bound[::-1],
+        x=np.concatenate([future_weeks, future_weeks[::-1]]),
+        y=np.concatenate([upper_bound, lower_bound[::-1]]),
         fill='tonexty',
         fillcolor='rgba(255, 127, 14, 0.2)',
         line=dict(color='rgba(255,255,255,0)'),
@@ -587,16 +982,14 @@ def main():
     st.sidebar.markdown("---")
     st.sidebar.markdown("### 📊 Key Metrics")
     
-    # Filter data for metrics
-    filtered_ride_data = ride_data.copy()
-    if selected_weeks:
-        filtered_ride_data = filtered_ride_data[filtered_ride_data['week_index'].isin(selected_weeks)]
-    if selected_type and selected_type != 'All':
-        filtered_ride_data = filtered_ride_data[filtered_ride_data['type'] == selected_type.lower()]
+    # One hashable key per selection; every view filters through get_filtered
+    # and pulls only the cached aggregates it shows
+    weeks_key = tuple(sorted(selected_weeks))
+    # The key is sorted, so its ends are the selected week range
+    week_range = (weeks_key[0], weeks_key[-1]) if weeks_key else ()
     
-    total_rides = filtered_ride_data['ride_count'].sum()
-    unique_locations = filtered_ride_data[['lat', 'long']].drop_duplicates().shape[0]
-    avg_rides_per_location = filtered_ride_data['ride_count'].mean()
+    total_rides, unique_locations, trip_rows = get_ride_metrics(weeks_key, selected_type)
+    avg_rides_per_location = total_rides / trip_rows if trip_rows else float('nan')
     
     st.sidebar.metric("Total Rides", f"{total_rides:,}")
     st.sidebar.metric("Unique Locations", f"{unique_locations:,}")
@@ -614,6 +1007,7 @@ def main():
             - 🔴 **Red Circles** = **Drop-off Locations** (where customers end their rides)
             - 🔥 **Heatmap Overlay** = **High-density areas** (more rides = hotter colors)
             - **Circle Size** = **Ride Frequency** (bigger circles = more rides at that location)
+            - The first view shows the busiest 1,000 locations; after you pan or zoom, every location in the visible area is drawn
             
             **Layer Controls (top-right):**
             - Toggle different layers on/off
@@ -629,58 +1023,74 @@ def main():
         
         # Create and display map
         with st.spinner('Generating interactive map...'):
-            hotspot_map = create_hotspot_map(
-                ride_data, 
-                selected_weeks, 
-                selected_type, 
-                cluster_size
+            # Only send the points inside the last reported viewport
+            map_view = st.session_state.get('hotspot_map_view')
+            hotspot_map = get_hotspot_map(
+                weeks_key,
+                selected_type,
+                cluster_size,
+                map_view['key'] if map_view else None,
+                map_view['zoom'] if map_view else None
             )
             
-            # Display map
-            map_data = st_folium(hotspot_map, width=1200, height=600)
+            # Display map, keeping the user's view when the markers change
+            from streamlit_folium import st_folium
+            map_data = st_folium(
+                hotspot_map,
+                width=1200,
+                height=600,
+                center=map_view['center'] if map_view else None,
+                zoom=map_view['zoom'] if map_view else None,
+                # Only round-trip what the app reads; a fixed key keeps the
+                # component mounted across reruns
+                returned_objects=['last_object_clicked_popup', 'bounds', 'zoom'],
+                key='hotspot_map',
+                # Already rendered when the map was built and cached
+                render=False
+            )
+            st.session_state['hotspot_map_view'] = get_map_view(map_data, hotspot_map) or map_view
             
             # Show selected point info
             if map_data['last_object_clicked_popup']:
                 st.info(f"Selected: {map_data['last_object_clicked_popup']}")
         
         # Add summary statistics for the map
+        origins_count, destinations_count, unique_origins, unique_destinations = get_type_metrics(
+            weeks_key, selected_type
+        )
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            origins_count = len(filtered_ride_data[filtered_ride_data['type'] == 'origin'])
             st.metric("Pickup Locations", f"{origins_count:,}")
         
         with col2:
-            destinations_count = len(filtered_ride_data[filtered_ride_data['type'] == 'destination'])
             st.metric("Drop-off Locations", f"{destinations_count:,}")
         
         with col3:
-            unique_origins = filtered_ride_data[filtered_ride_data['type'] == 'origin'][['lat', 'long']].drop_duplicates().shape[0]
             st.metric("Unique Pickup Spots", f"{unique_origins:,}")
         
         with col4:
-            unique_destinations = filtered_ride_data[filtered_ride_data['type'] == 'destination'][['lat', 'long']].drop_duplicates().shape[0]
             st.metric("Unique Drop-off Spots", f"{unique_destinations:,}")
     
     if analysis_type in ["📊 Distribution Analysis", "🌟 All Views"]:
         st.header("📈 Ride Distribution Analysis")
         
         # Create distribution charts
-        dist_fig = create_ride_distribution_chart(ride_data, selected_weeks, selected_type)
+        dist_fig = get_distribution_chart(weeks_key, selected_type)
         st.plotly_chart(dist_fig, use_container_width=True)
     
     if analysis_type in ["👥 User Analysis", "🌟 All Views"]:
         st.header("👥 Advanced User Intelligence")
         
         # Create user analysis charts
-        user_fig = create_user_analysis_chart(user_data, selected_weeks)
+        user_fig = get_user_analysis_chart(*week_range)
         st.plotly_chart(user_fig, use_container_width=True)
     
     if analysis_type in ["🔮 Predictive Insights", "🌟 All Views"]:
         st.header("🔮 Predictive Analytics & Business Intelligence")
         
         # Create predictive insights
-        insights = create_predictive_insights(user_data, ride_data)
+        insights = create_predictive_insights(user_data, get_weekly_totals())
         
         # Add business recommendations
         st.subheader("💡 Strategic Recommendations")
@@ -13,31 +13,138 @@ Date: 2024
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 import seaborn as sns
-from geopy.distance import geodesic
 import folium
 from folium import plugins
 import warnings
+import gc
 warnings.filterwarnings('ignore')
 
 # Set style for better plots
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
+# Column types for the raw trip CSV. Coordinates only need float32 precision
+# (~1 m); trip_id stays float64 because exports write it in scientific notation
+TRIP_DTYPES = {
+    'origin_lat': 'float32',
+    'origin_long': 'float32',
+    'destination_lat': 'float32',
+    'destination_long': 'float32',
+    'week_index': 'int32',
+    'customer_id': 'int64',
+    'trip_id': 'float64'
+}
+
+# Decimal places kept for coordinates written into the map HTML; float32
+# values widened to float64 otherwise carry noise digits like 40.7128000259
+COORD_DECIMALS = 5
+
+# Builds one clustered circle marker per [lat, long, customer_id, ride_count]
+# row in the browser; {color} and {label} are filled in per location type
+CIRCLE_MARKER_CALLBACK = """
+function (row) {{
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+                                {{radius: 3, color: '{color}', fill: true, fillOpacity: 0.6}});
+    marker.bindPopup('{label}<br>Customer: ' + row[2] + '<br>Rides: ' + row[3]);
+    return marker;
+}}
+"""
+
+# Above this many users the scatter plots are drawn as a binned density image
+SCATTER_DENSITY_MIN_POINTS = 10000
+SCATTER_DENSITY_BINS = 200
+
+# Mean Earth radius used by the haversine distance
+EARTH_RADIUS_MILES = 3958.7613
+# Rows per haversine block: four float64 working arrays of this length
+# (2 MB) fit in L2/L3 cache instead of streaming through main memory
+HAVERSINE_BLOCK_ROWS = 65536
+
+def _haversine_miles(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in miles between two sets of points.
+
+    Missing coordinates propagate as NaN, so callers can dropna afterwards.
+    The formula runs over blocks of HAVERSINE_BLOCK_ROWS rows, so its few
+    working arrays stay cache-sized however long the inputs are.
+    """
+    lat1, lon1, lat2, lon2 = (np.asarray(a) for a in (lat1, lon1, lat2, lon2))
+    out = np.empty(len(lat1), dtype=np.float64)
+    for start in range(0, len(out), HAVERSINE_BLOCK_ROWS):
+        block = slice(start, start + HAVERSINE_BLOCK_ROWS)
+        _haversine_block(lat1[block], lon1[block], lat2[block], lon2[block], out[block])
+    return out
+
+def _haversine_block(lat1, lon1, lat2, lon2, a):
+    """Write the haversine distances for one block into a, working in place."""
+    lat1, lon1, lat2, lon2 = (np.radians(x, dtype=np.float64) for x in (lat1, lon1, lat2, lon2))
+    
+    # a = sin^2(dlat/2) + cos(lat1) * cos(lat2) * sin^2(dlon/2)
+    np.subtract(lat2, lat1, out=a)
+    a *= 0.5
+    np.sin(a, out=a)
+    np.square(a, out=a)
+    lon2 -= lon1
+    lon2 *= 0.5
+    np.sin(lon2, out=lon2)
+    np.square(lon2, out=lon2)
+    np.cos(lat1, out=lat1)
+    np.cos(lat2, out=lat2)
+    lat1 *= lat2
+    lat1 *= lon2
+    a += lat1
+    
+    # d = 2R * arcsin(sqrt(a))
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_MILES
+
+def _log10p1(values):
+    """log10(values + 1) via log1p, scaled in place so only one array is allocated."""
+    out = np.log1p(np.asarray(values, dtype=np.float64))
+    out /= np.log(10)
+    return out
+
+def _scatter_or_density(x, y, color, cmap):
+    """Scatter x against y, or for large inputs bin them into a fixed grid and draw that instead.
+
+    Binning costs one O(N) pass and the image size no longer depends on N,
+    whereas a scatter draws (and rasterizes) one marker per point.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if len(x) <= SCATTER_DENSITY_MIN_POINTS:
+        plt.scatter(x, y, alpha=0.6, s=50, color=color)
+        return
+    
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=SCATTER_DENSITY_BINS)
+    plt.imshow(np.ma.masked_equal(counts.T, 0), origin='lower', aspect='auto', cmap=cmap, norm=LogNorm(),
+               extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+    plt.colorbar(label='Users')
+
 class UberDataAnalyzer:
     """Main class for analyzing Uber ride data."""
     
-    def __init__(self, data_path):
-        """Initialize with data path."""
+    def __init__(self, data_path, verbose=False):
+        """Initialize with data path; verbose also prints full DataFrame diagnostics."""
         self.data_path = data_path
+        self.verbose = verbose
         self.df = None
         self.user_summary = None
         self.ride_summary = None
+        self.location_summary = None
+        # User-level statistics reused by the plots and the export, computed on first use
+        self._heavy_user_count = None
+        self._correlation = None
         
     def load_data(self):
         """Load and perform initial data exploration."""
         print("Loading data...")
-        self.df = pd.read_csv(self.data_path)
+        # Multithreaded PyArrow parser, with the column types fixed up front and
+        # only the columns the analysis uses kept in memory
+        self.df = pd.read_csv(self.data_path, engine='pyarrow', usecols=list(TRIP_DTYPES), dtype=TRIP_DTYPES)
+        # Groupbys on customer_id then work on the small integer category codes
+        self.df['customer_id'] = self.df['customer_id'].astype('category')
         
         print(f"Dataset shape: {self.df.shape}")
         print(f"Columns: {list(self.df.columns)}")
@@ -45,22 +152,21 @@ class UberDataAnalyzer:
         print(f"Unique customers: {self.df['customer_id'].nunique()}")
         print(f"Total trips: {len(self.df)}")
         
-        # Display basic info
-        print("\nData Info:")
-        print(self.df.info())
-        print("\nFirst few rows:")
-        print(self.df.head())
+        # Display basic info (each of these scans the whole frame)
+        if self.verbose:
+            print("\nData Info:")
+            print(self.df.info())
+            print("\nFirst few rows:")
+            print(self.df.head())
         
         return self.df
     
-    def calculate_distance(self, row):
-        """Calculate distance between origin and destination using geodesic distance."""
-        try:
-            origin = (row['origin_lat'], row['origin_long'])
-            destination = (row['destination_lat'], row['destination_long'])
-            return geodesic(origin, destination).miles
-        except:
-            return np.nan
+    def calculate_distances(self, df):
+        """Calculate origin-to-destination haversine distances for every trip in df."""
+        return _haversine_miles(
+            df['origin_lat'].values, df['origin_long'].values,
+            df['destination_lat'].values, df['destination_long'].values
+        )
     
     def compute_user_metrics(self):
         """Compute user-level metrics: rides per user, weekly rides, avg distance."""
@@ -68,40 +174,48 @@ class UberDataAnalyzer:
         
         # Calculate distance for each trip
         print("Calculating trip distances...")
-        self.df['distance_miles'] = self.df.apply(self.calculate_distance, axis=1)
+        self.df['distance_miles'] = self.calculate_distances(self.df)
         
-        # Remove trips with invalid distances
-        valid_trips = self.df.dropna(subset=['distance_miles'])
+        # Remove trips with invalid distances, copying only the columns aggregated below
+        valid_trips = self.df.loc[self.df['distance_miles'].notna(),
+                                  ['customer_id', 'trip_id', 'distance_miles', 'week_index']]
         print(f"Valid trips after distance calculation: {len(valid_trips)}")
         
-        # User-level aggregations
-        user_metrics = valid_trips.groupby('customer_id').agg({
-            'trip_id': 'count',  # Total rides per user
-            'distance_miles': 'mean',  # Average distance per user
-            'week_index': 'nunique'  # Number of weeks user was active
-        }).rename(columns={
-            'trip_id': 'total_rides',
-            'distance_miles': 'avg_distance_miles',
-            'week_index': 'active_weeks'
-        })
+        # User-level aggregations, including the activity window, in one groupby pass
+        user_metrics = valid_trips.groupby('customer_id', observed=True).agg(
+            total_rides=('trip_id', 'count'),  # Total rides per user
+            avg_distance_miles=('distance_miles', 'mean'),  # Average distance per user
+            active_weeks=('week_index', 'nunique'),  # Number of weeks user was active
+            first_week=('week_index', 'min'),
+            last_week=('week_index', 'max')
+        )
         
         # Calculate weekly rides per user
-        user_metrics['weekly_rides'] = user_metrics['total_rides'] / user_metrics['active_weeks']
-        
-        # Add user activity details
-        user_activity = valid_trips.groupby('customer_id')['week_index'].agg(['min', 'max']).rename(columns={
-            'min': 'first_week',
-            'max': 'last_week'
-        })
+        user_metrics.insert(3, 'weekly_rides', user_metrics['total_rides'] / user_metrics['active_weeks'])
         
-        self.user_summary = user_metrics.join(user_activity)
+        self.user_summary = user_metrics
+        self._heavy_user_count = None
+        self._correlation = None
         
         print(f"User summary created for {len(self.user_summary)} users")
-        print("\nUser Summary Statistics:")
-        print(self.user_summary.describe())
+        if self.verbose:
+            print("\nUser Summary Statistics:")
+            print(self.user_summary.describe())
         
         return self.user_summary
     
+    def heavy_user_count(self):
+        """Number of users averaging more than 1 ride per week (cached)."""
+        if self._heavy_user_count is None:
+            self._heavy_user_count = int((self.user_summary['weekly_rides'] > 1).sum())
+        return self._heavy_user_count
+    
+    def distance_frequency_correlation(self):
+        """Correlation between weekly rides and average distance per user (cached)."""
+        if self._correlation is None:
+            self._correlation = self.user_summary['weekly_rides'].corr(self.user_summary['avg_distance_miles'])
+        return self._correlation
+    
     def create_histogram_rides_per_user(self):
         """Create histogram of rides per user."""
         print("\nCreating histogram of rides per user...")
@@ -118,7 +232,7 @@ class UberDataAnalyzer:
         
         # Log scale histogram for better visualization
         plt.subplot(2, 2, 2)
-        plt.hist(np.log10(self.user_summary['total_rides'] + 1), bins=50, alpha=0.7, color='lightcoral', edgecolor='black')
+        plt.hist(_log10p1(self.user_summary['total_rides']), bins=50, alpha=0.7, color='lightcoral', edgecolor='black')
         plt.title('Distribution of Total Rides per User (Log Scale)', fontsize=14, fontweight='bold')
         plt.xlabel('Log10(Total Rides + 1)')
         plt.ylabel('Number of Users')
@@ -144,7 +258,7 @@ class UberDataAnalyzer:
         plt.show()
         
         # Calculate proportion of users with more than 1 ride per week
-        users_more_than_1_ride_per_week = (self.user_summary['weekly_rides'] > 1).sum()
+        users_more_than_1_ride_per_week = self.heavy_user_count()
         total_users = len(self.user_summary)
         proportion = users_more_than_1_ride_per_week / total_users
         
@@ -161,24 +275,24 @@ class UberDataAnalyzer:
         
         # Main scatter plot
         plt.subplot(2, 2, 1)
-        plt.scatter(self.user_summary['weekly_rides'], self.user_summary['avg_distance_miles'], 
-                   alpha=0.6, s=50, color='purple')
+        _scatter_or_density(self.user_summary['weekly_rides'], self.user_summary['avg_distance_miles'],
+                            color='purple', cmap='Purples')
         plt.title('Average Distance vs Weekly Rides per User', fontsize=14, fontweight='bold')
         plt.xlabel('Weekly Rides')
         plt.ylabel('Average Distance (miles)')
         plt.grid(True, alpha=0.3)
         
-        # Add trend line
-        z = np.polyfit(self.user_summary['weekly_rides'], self.user_summary['avg_distance_miles'], 1)
-        p = np.poly1d(z)
-        plt.plot(self.user_summary['weekly_rides'], p(self.user_summary['weekly_rides']), 
-                "r--", alpha=0.8, linewidth=2)
+        # Add trend line; a straight line only needs its two end points
+        x = self.user_summary['weekly_rides'].to_numpy()
+        slope, intercept = np.polyfit(x, self.user_summary['avg_distance_miles'].to_numpy(), 1)
+        x_ends = np.array([x.min(), x.max()])
+        plt.plot(x_ends, slope * x_ends + intercept, "r--", alpha=0.8, linewidth=2)
         
         # Log scale scatter plot
         plt.subplot(2, 2, 2)
-        plt.scatter(np.log10(self.user_summary['weekly_rides'] + 1), 
-                   np.log10(self.user_summary['avg_distance_miles'] + 1), 
-                   alpha=0.6, s=50, color='orange')
+        _scatter_or_density(_log10p1(self.user_summary['weekly_rides']),
+                            _log10p1(self.user_summary['avg_distance_miles']),
+                            color='orange', cmap='Oranges')
         plt.title('Log Scale: Distance vs Weekly Rides', fontsize=14, fontweight='bold')
         plt.xlabel('Log10(Weekly Rides + 1)')
         plt.ylabel('Log10(Average Distance + 1)')
@@ -194,7 +308,7 @@ class UberDataAnalyzer:
         
         # Correlation analysis
         plt.subplot(2, 2, 4)
-        correlation = self.user_summary['weekly_rides'].corr(self.user_summary['avg_distance_miles'])
+        correlation = self.distance_frequency_correlation()
         plt.text(0.5, 0.5, f'Correlation: {correlation:.3f}', 
                 ha='center', va='center', fontsize=16, fontweight='bold',
                 bbox=dict(boxstyle="round,pad=0.3", facecolor="lightgray"))
@@ -213,36 +327,40 @@ class UberDataAnalyzer:
         """Prepare map-ready dataset with origins and destinations."""
         print("\nPreparing map data for visualization...")
         
-        # Load the original data for mapping
-        map_df = self.df.copy()
-        
-        # Calculate distance for mapping data
-        map_df['distance_miles'] = map_df.apply(self.calculate_distance, axis=1)
-        map_df = map_df.dropna(subset=['distance_miles'])
-        
-        # Create origins dataset (blue markers)
-        origins = map_df[['origin_lat', 'origin_long', 'customer_id', 'trip_id', 'week_index']].copy()
-        origins['type'] = 'origin'
-        origins['lat'] = origins['origin_lat']
-        origins['long'] = origins['origin_long']
-        origins = origins[['lat', 'long', 'customer_id', 'trip_id', 'week_index', 'type']]
-        
-        # Create destinations dataset (red markers)
-        destinations = map_df[['destination_lat', 'destination_long', 'customer_id', 'trip_id', 'week_index']].copy()
-        destinations['type'] = 'destination'
-        destinations['lat'] = destinations['destination_lat']
-        destinations['long'] = destinations['destination_long']
-        destinations = destinations[['lat', 'long', 'customer_id', 'trip_id', 'week_index', 'type']]
+        # Reuse the distances from compute_user_metrics; dropna already
+        # returns a new frame, so no copy of the full data is needed
+        if 'distance_miles' not in self.df:
+            self.df['distance_miles'] = self.calculate_distances(self.df)
+        map_df = self.df.dropna(subset=['distance_miles'])
+        
+        # Stack origins (blue markers) on top of destinations (red markers) as
+        # plain arrays and build the combined frame in one go
+        n_trips = len(map_df)
+        customers = map_df['customer_id'].array
+        self.ride_summary = pd.DataFrame({
+            'lat': np.concatenate([map_df['origin_lat'].to_numpy(), map_df['destination_lat'].to_numpy()]),
+            'long': np.concatenate([map_df['origin_long'].to_numpy(), map_df['destination_long'].to_numpy()]),
+            'customer_id': pd.Categorical.from_codes(np.tile(customers.codes, 2), dtype=customers.dtype),
+            'trip_id': np.tile(map_df['trip_id'].to_numpy(), 2),
+            'week_index': np.tile(map_df['week_index'].to_numpy(), 2),
+            'type': np.repeat(np.array(['origin', 'destination']), n_trips)
+        })
         
-        # Combine for map visualization
-        self.ride_summary = pd.concat([origins, destinations], ignore_index=True)
+        # Add ride count by location for hotspot analysis, broadcast back onto
+        # the trip rows in the same hash pass instead of merging a count table
+        self.ride_summary['ride_count'] = self.ride_summary.groupby(
+            ['lat', 'long', 'type'], sort=False, observed=True
+        )['trip_id'].transform('size')
         
-        # Add ride count by location for hotspot analysis
-        location_counts = self.ride_summary.groupby(['lat', 'long', 'type']).size().reset_index(name='ride_count')
-        self.ride_summary = self.ride_summary.merge(location_counts, on=['lat', 'long', 'type'], how='left')
+        # One row per unique hotspot for the map; the per-trip rows above are
+        # kept because the dashboard filters them by week
+        self.location_summary = self.ride_summary.drop_duplicates(['lat', 'long', 'type'])[
+            ['lat', 'long', 'type', 'customer_id', 'ride_count']
+        ].reset_index(drop=True)
         
         print(f"Map data prepared: {len(self.ride_summary)} location points")
-        print(f"Origins: {len(origins)}, Destinations: {len(destinations)}")
+        print(f"Origins: {n_trips}, Destinations: {n_trips}")
+        print(f"Unique hotspots: {len(self.location_summary)}")
         
         return self.ride_summary
     
@@ -256,32 +374,30 @@ class UberDataAnalyzer:
         # Create base map
         m = folium.Map(location=nyc_center, zoom_start=11, tiles='OpenStreetMap')
         
-        # Add origins (blue markers)
-        origins = self.ride_summary[self.ride_summary['type'] == 'origin']
-        for idx, row in origins.iterrows():
-            folium.CircleMarker(
-                location=[row['lat'], row['long']],
-                radius=3,
-                popup=f"Origin<br>Customer: {row['customer_id']}<br>Rides: {row['ride_count']}",
-                color='blue',
-                fill=True,
-                fillOpacity=0.6
-            ).add_to(m)
-        
-        # Add destinations (red markers)
-        destinations = self.ride_summary[self.ride_summary['type'] == 'destination']
-        for idx, row in destinations.iterrows():
-            folium.CircleMarker(
-                location=[row['lat'], row['long']],
-                radius=3,
-                popup=f"Destination<br>Customer: {row['customer_id']}<br>Rides: {row['ride_count']}",
-                color='red',
-                fill=True,
-                fillOpacity=0.6
+        # One marker per unique hotspot rather than per trip, with the
+        # coordinates rounded once for both the markers and the heatmap
+        locations = self.location_summary
+        lats = locations['lat'].to_numpy(np.float64).round(COORD_DECIMALS)
+        longs = locations['long'].to_numpy(np.float64).round(COORD_DECIMALS)
+        ride_counts = locations['ride_count'].to_numpy()
+        # Popup text is assembled in the browser from these raw values, so the
+        # only Python-side work is one vectorised decode of the categories
+        customer_ids = np.asarray(locations['customer_id'])
+        for location_type, color, label in (('origin', 'blue', 'Origin'),
+                                            ('destination', 'red', 'Destination')):
+            is_type = (locations['type'] == location_type).to_numpy()
+            # Raw rows are shipped as JSON and turned into markers client-side
+            plugins.FastMarkerCluster(
+                list(zip(lats[is_type].tolist(),
+                         longs[is_type].tolist(),
+                         customer_ids[is_type].tolist(),
+                         ride_counts[is_type].tolist())),
+                callback=CIRCLE_MARKER_CALLBACK.format(color=color, label=label),
+                name=f"{label}s"
             ).add_to(m)
         
         # Add heatmap layer
-        heat_data = [[row['lat'], row['long'], row['ride_count']] for idx, row in self.ride_summary.iterrows()]
+        heat_data = np.column_stack([lats, longs, ride_counts]).tolist()
         plugins.HeatMap(heat_data, name="Ride Density").add_to(m)
         
         # Add layer control
@@ -302,9 +418,11 @@ class UberDataAnalyzer:
         user_export.to_csv('../data/user_summary.csv', index=False)
         print(f"User summary exported: {len(user_export)} users")
         
-        # Export ride summary for mapping
-        ride_export = self.ride_summary.copy()
-        ride_export.to_csv('../data/ride_summary.csv', index=False)
+        # Export ride summary for mapping (2 rows per trip) as typed, compressed
+        # Parquet; writing it skips the per-cell text formatting of a CSV. Its
+        # own file name keeps it apart from the dashboard's cache of the CSV
+        ride_export = self.ride_summary
+        ride_export.to_parquet('../data/ride_summary_export.parquet', engine='pyarrow', compression='zstd', index=False)
         print(f"Ride summary exported: {len(ride_export)} location points")
         
         # Create additional summary statistics for Tableau
@@ -325,9 +443,9 @@ class UberDataAnalyzer:
                 self.user_summary['total_rides'].mean(),
                 self.user_summary['weekly_rides'].mean(),
                 self.user_summary['avg_distance_miles'].mean(),
-                (self.user_summary['weekly_rides'] > 1).sum(),
-                (self.user_summary['weekly_rides'] > 1).mean(),
-                self.user_summary['weekly_rides'].corr(self.user_summary['avg_distance_miles'])
+                self.heavy_user_count(),
+                self.heavy_user_count() / len(self.user_summary),
+                self.distance_frequency_correlation()
             ]
         })
         summary_stats.to_csv('../data/summary_statistics.csv', index=False)
@@ -335,7 +453,7 @@ class UberDataAnalyzer:
         
         print("\nExported files:")
         print("- user_summary.csv: User-level metrics")
-        print("- ride_summary.csv: Location data for mapping")
+        print("- ride_summary_export.parquet: Location data for mapping")
         print("- summary_statistics.csv: Key metrics for dashboard")
         
         return user_export, ride_export, summary_stats
@@ -359,6 +477,11 @@ class UberDataAnalyzer:
         # Prepare map data
         self.prepare_map_data()
         
+        # The raw trip table is not needed past this point; release it before
+        # the map and export steps build their own copies
+        self.df = None
+        gc.collect()
+        
         # Create map
         self.create_nyc_map()
         
@@ -397,7 +520,7 @@ def main():
     print("- distance_vs_rides_scatter.png") 
     print("- nyc_ride_hotspots.html")
     print("- user_summary.csv")
-    print("- ride_summary.csv")
+    print("- ride_summary_export.parquet")
     print("- summary_statistics.csv")
 
 if __name__ == "__main__":